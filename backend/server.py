@@ -1,14 +1,33 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import List, Optional
+import asyncio
+import logging
 import os
 from datetime import datetime, timezone
-import yfinance as yf
+import httpx
+import numpy as np
 import uuid
+from cachetools import TTLCache
 from contextlib import asynccontextmanager
 
+logger = logging.getLogger(__name__)
+
+# Yahoo's chart endpoint — the same one yfinance's history() wraps, but
+# fetched directly over an async client so N symbols cost max(RTT), not
+# sum(RTT), and the event loop never blocks on a price lookup
+_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?interval=1d&range=1d"
+
+# Shared async client created in lifespan; keep-alive connections and HTTP/2
+# multiplexing are reused across all lookups
+_HTTP: Optional[httpx.AsyncClient] = None
+
+# Short-lived price cache so repeat lookups within a minute skip the network
+_PRICE_CACHE = TTLCache(maxsize=4096, ttl=60)
+
 # Database models
 class Asset(BaseModel):
     id: str
@@ -45,13 +64,24 @@ class Portfolio(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    global _HTTP
     app.mongodb_client = AsyncIOMotorClient(os.environ.get("MONGO_URL"))
     app.mongodb = app.mongodb_client[os.environ.get("DB_NAME", "networth_db")]
+    # Yahoo rejects requests without a browser-ish User-Agent
+    _HTTP = httpx.AsyncClient(
+        http2=True,
+        timeout=5.0,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; ntwrth/1.0)"}
+    )
+    await app.mongodb.portfolios.create_index("user_id", unique=True)
+    app.price_refresh_task = asyncio.create_task(_price_refresh_loop(app))
     yield
     # Shutdown
+    app.price_refresh_task.cancel()
+    await _HTTP.aclose()
     app.mongodb_client.close()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -67,62 +97,144 @@ async def get_database():
     return app.mongodb
 
 # Helper function to get stock price
-def get_stock_price(symbol: str) -> float:
+async def get_stock_price(symbol: str) -> float:
+    cached = _PRICE_CACHE.get(symbol)
+    if cached is not None:
+        return cached
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1d")
-        if not data.empty:
-            return float(data['Close'].iloc[-1])
-        else:
-            # Fallback to info if history is empty
-            info = ticker.info
-            return info.get('currentPrice', info.get('regularMarketPrice', 0.0))
-    except Exception as e:
-        print(f"Error getting price for {symbol}: {e}")
+        response = await _HTTP.get(_CHART_URL.format(symbol=symbol))
+        response.raise_for_status()
+        meta = response.json()["chart"]["result"][0]["meta"]
+        price = float(meta["regularMarketPrice"])
+    except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError) as e:
+        logger.warning("Error getting price for %s: %s", symbol, e)
         return 0.0
+    if price > 0:
+        _PRICE_CACHE[symbol] = price
+    return price
 
-# Get or create portfolio
-async def get_portfolio(db) -> Portfolio:
-    portfolio_data = await db.portfolios.find_one({"user_id": "default"})
-    if portfolio_data:
-        # Convert MongoDB document to Portfolio model
-        portfolio_data.pop("_id", None)
-        return Portfolio(**portfolio_data)
-    else:
-        # Create new portfolio
-        new_portfolio = Portfolio()
-        await db.portfolios.insert_one(new_portfolio.dict())
-        return new_portfolio
+# Fetch prices for several symbols concurrently
+async def get_stock_prices_async(symbols: List[str]) -> dict:
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    prices = await asyncio.gather(*[get_stock_price(s) for s in symbols])
+    return dict(zip(symbols, prices))
+
+# Asset types mapped to bincount slots; unknown types land in the last slot
+# and are excluded from net worth, matching the old per-type sums
+_TYPE_CODE = {"stock": 0, "etf": 1, "super": 2, "savings": 3}
+
+# Sum asset values by type in one vectorized pass
+def _compute_totals(assets: List[Asset]) -> tuple:
+    if not assets:
+        return dict.fromkeys(_TYPE_CODE, 0.0), 0.0
+    values = np.fromiter((a.value for a in assets), dtype=np.float64, count=len(assets))
+    codes = np.fromiter(
+        (_TYPE_CODE.get(a.type, len(_TYPE_CODE)) for a in assets),
+        dtype=np.int8, count=len(assets)
+    )
+    sums = np.bincount(codes, weights=values, minlength=len(_TYPE_CODE) + 1)
+    totals = {asset_type: float(sums[code]) for asset_type, code in _TYPE_CODE.items()}
+    return totals, float(sums[:len(_TYPE_CODE)].sum())
+
+# Symbols whose value should be refreshed from live prices
+def _symbols_to_refresh(assets: List[Asset]) -> set:
+    return {
+        a.symbol for a in assets
+        if a.symbol and a.quantity and a.type in ["stock", "etf"] and a.manual_value is None
+    }
+
+# How often the background task refreshes live prices
+PRICE_REFRESH_INTERVAL = 60
+
+# Refresh live prices on the portfolio and persist the changed values
+async def _refresh_prices(db, portfolio: "Portfolio") -> int:
+    symbols = _symbols_to_refresh(portfolio.assets)
+    if not symbols:
+        # Everything is manual or non-market (super/savings); nothing to fetch
+        return 0
+    prices = await get_stock_prices_async(symbols)
+    refreshed = []
+    for asset in portfolio.assets:
+        # Re-check the full predicate per asset: another asset may share the
+        # symbol while being manually overridden or non-market
+        if (asset.type in ["stock", "etf"] and asset.manual_value is None
+                and asset.symbol in prices and prices[asset.symbol] > 0 and asset.quantity):
+            asset.value = prices[asset.symbol] * asset.quantity
+            refreshed.append((asset.id, asset.value))
+    if refreshed:
+        await db.portfolios.update_one(
+            {"user_id": "default"},
+            {"$set": {f"assets.$[a{i}].value": value for i, (_, value) in enumerate(refreshed)}},
+            array_filters=[{f"a{i}.id": asset_id} for i, (asset_id, _) in enumerate(refreshed)]
+        )
+    return len(refreshed)
+
+# Background task keeping stored asset values current so request handlers
+# never wait on Yahoo
+async def _price_refresh_loop(app: FastAPI):
+    while True:
+        await asyncio.sleep(PRICE_REFRESH_INTERVAL)
+        try:
+            portfolio = await get_portfolio(app.mongodb, projection={"assets": 1})
+            await _refresh_prices(app.mongodb, portfolio)
+        except Exception as e:
+            logger.warning("Price refresh failed: %s", e)
+
+# Process-local portfolio cache. Handlers mutate the cached object in place
+# right alongside their targeted DB writes, so it stays current without a
+# re-read per request. Only safe with a single worker process; a multi-worker
+# deploy would need shared invalidation (e.g. Redis pub/sub) or per-request
+# fetches.
+_PORTFOLIO_CACHE: Optional[Portfolio] = None
+_PORTFOLIO_LOCK = asyncio.Lock()
+
+# Get or create portfolio. A projection (e.g. {"assets": 1}) limits what a
+# cache miss fetches and validates; missing list fields fall back to the model
+# defaults. Projected reads don't populate the cache, which only ever holds
+# the full document.
+async def get_portfolio(db, projection=None) -> Portfolio:
+    global _PORTFOLIO_CACHE
+    if _PORTFOLIO_CACHE is not None:
+        return _PORTFOLIO_CACHE
+    if projection is not None:
+        portfolio_data = await db.portfolios.find_one(
+            {"user_id": "default"},
+            {**projection, "user_id": 1, "_id": 0}
+        )
+        return Portfolio(**portfolio_data) if portfolio_data else Portfolio()
+    async with _PORTFOLIO_LOCK:
+        if _PORTFOLIO_CACHE is not None:
+            return _PORTFOLIO_CACHE
+        portfolio_data = await db.portfolios.find_one({"user_id": "default"})
+        if portfolio_data:
+            # Convert MongoDB document to Portfolio model
+            portfolio_data.pop("_id", None)
+            _PORTFOLIO_CACHE = Portfolio(**portfolio_data)
+        else:
+            # Create new portfolio
+            _PORTFOLIO_CACHE = Portfolio()
+            await db.portfolios.insert_one(_PORTFOLIO_CACHE.model_dump())
+        return _PORTFOLIO_CACHE
 
 # API Routes
 
 @app.get("/api/portfolio")
 async def get_portfolio_data(db=Depends(get_database)):
-    """Get current portfolio with live stock prices"""
+    """Get current portfolio; prices are kept fresh by the background task"""
     portfolio = await get_portfolio(db)
-    
-    # Update stock prices
-    for asset in portfolio.assets:
-        if asset.symbol and asset.type in ["stock", "etf"]:
-            if asset.manual_value is None:  # Only update if not manually overridden
-                current_price = get_stock_price(asset.symbol)
-                if current_price > 0 and asset.quantity:
-                    asset.value = current_price * asset.quantity
-    
+
     # Calculate totals
-    total_stocks = sum(a.value for a in portfolio.assets if a.type == "stock")
-    total_etfs = sum(a.value for a in portfolio.assets if a.type == "etf")
-    total_super = sum(a.value for a in portfolio.assets if a.type == "super")
-    total_savings = sum(a.value for a in portfolio.assets if a.type == "savings")
-    net_worth = total_stocks + total_etfs + total_super + total_savings
-    
+    totals, net_worth = _compute_totals(portfolio.assets)
+
     return {
         "portfolio": portfolio,
         "totals": {
-            "stocks": total_stocks,
-            "etfs": total_etfs,
-            "super": total_super,
-            "savings": total_savings,
+            "stocks": totals["stock"],
+            "etfs": totals["etf"],
+            "super": totals["super"],
+            "savings": totals["savings"],
             "net_worth": net_worth
         }
     }
@@ -130,8 +242,6 @@ async def get_portfolio_data(db=Depends(get_database)):
 @app.post("/api/assets")
 async def add_asset(asset_data: dict, db=Depends(get_database)):
     """Add a new asset to portfolio"""
-    portfolio = await get_portfolio(db)
-    
     # Generate unique ID
     asset_id = str(uuid.uuid4())
     
@@ -139,7 +249,7 @@ async def add_asset(asset_data: dict, db=Depends(get_database)):
     value = asset_data.get("value", 0.0)
     if asset_data.get("symbol") and asset_data.get("quantity"):
         if asset_data["type"] in ["stock", "etf"]:
-            current_price = get_stock_price(asset_data["symbol"])
+            current_price = await get_stock_price(asset_data["symbol"])
             if current_price > 0:
                 value = current_price * asset_data["quantity"]
     
@@ -153,73 +263,70 @@ async def add_asset(asset_data: dict, db=Depends(get_database)):
         manual_value=asset_data.get("manual_value")
     )
     
-    portfolio.assets.append(new_asset)
-    
-    # Update database
+    # Push only the new asset; no need to read the document first
     await db.portfolios.update_one(
         {"user_id": "default"},
-        {"$set": {"assets": [asset.dict() for asset in portfolio.assets]}},
+        {"$push": {"assets": new_asset.model_dump()}},
         upsert=True
     )
-    
+    if _PORTFOLIO_CACHE is not None:
+        _PORTFOLIO_CACHE.assets.append(new_asset)
+
     return {"message": "Asset added successfully", "asset": new_asset}
 
 @app.delete("/api/assets/{asset_id}")
 async def delete_asset(asset_id: str, db=Depends(get_database)):
     """Delete an asset from portfolio"""
-    portfolio = await get_portfolio(db)
-    
-    # Remove asset
-    portfolio.assets = [a for a in portfolio.assets if a.id != asset_id]
-    
-    # Update database
+    # Pull only the matching asset; no need to read the document first
     await db.portfolios.update_one(
         {"user_id": "default"},
-        {"$set": {"assets": [asset.dict() for asset in portfolio.assets]}},
-        upsert=True
+        {"$pull": {"assets": {"id": asset_id}}}
     )
-    
+    if _PORTFOLIO_CACHE is not None:
+        _PORTFOLIO_CACHE.assets = [a for a in _PORTFOLIO_CACHE.assets if a.id != asset_id]
+
     return {"message": "Asset deleted successfully"}
 
 @app.put("/api/assets/{asset_id}")
 async def update_asset(asset_id: str, asset_data: dict, db=Depends(get_database)):
     """Update an existing asset"""
-    portfolio = await get_portfolio(db)
+    portfolio = await get_portfolio(db, projection={"assets": 1})
     
-    # Find and update asset
-    for asset in portfolio.assets:
+    # Find and update asset; work on a copy so the (possibly cached) portfolio
+    # only picks up the new values once the DB write has succeeded
+    for i, asset in enumerate(portfolio.assets):
         if asset.id == asset_id:
-            asset.name = asset_data.get("name", asset.name)
-            asset.type = asset_data.get("type", asset.type)
-            asset.symbol = asset_data.get("symbol", asset.symbol)
-            asset.quantity = asset_data.get("quantity", asset.quantity)
-            asset.manual_value = asset_data.get("manual_value", asset.manual_value)
-            
+            updated = asset.model_copy()
+            updated.name = asset_data.get("name", updated.name)
+            updated.type = asset_data.get("type", updated.type)
+            updated.symbol = asset_data.get("symbol", updated.symbol)
+            updated.quantity = asset_data.get("quantity", updated.quantity)
+            updated.manual_value = asset_data.get("manual_value", updated.manual_value)
+
             # Recalculate value if needed
-            if asset.manual_value is not None:
-                asset.value = asset.manual_value
-            elif asset.symbol and asset.quantity and asset.type in ["stock", "etf"]:
-                current_price = get_stock_price(asset.symbol)
+            if updated.manual_value is not None:
+                updated.value = updated.manual_value
+            elif updated.symbol and updated.quantity and updated.type in ["stock", "etf"]:
+                current_price = await get_stock_price(updated.symbol)
                 if current_price > 0:
-                    asset.value = current_price * asset.quantity
+                    updated.value = current_price * updated.quantity
             else:
-                asset.value = asset_data.get("value", asset.value)
+                updated.value = asset_data.get("value", updated.value)
+
+            # Write back only the changed sub-document
+            await db.portfolios.update_one(
+                {"user_id": "default"},
+                {"$set": {"assets.$[elem]": updated.model_dump()}},
+                array_filters=[{"elem.id": asset_id}]
+            )
+            portfolio.assets[i] = updated
             break
-    
-    # Update database
-    await db.portfolios.update_one(
-        {"user_id": "default"},
-        {"$set": {"assets": [asset.dict() for asset in portfolio.assets]}},
-        upsert=True
-    )
-    
+
     return {"message": "Asset updated successfully"}
 
 @app.post("/api/savings-goals")
 async def add_savings_goal(goal_data: dict, db=Depends(get_database)):
     """Add a new savings goal"""
-    portfolio = await get_portfolio(db)
-    
     goal_id = str(uuid.uuid4())
     new_goal = SavingsGoal(
         id=goal_id,
@@ -229,53 +336,56 @@ async def add_savings_goal(goal_data: dict, db=Depends(get_database)):
         deadline=goal_data.get("deadline")
     )
     
-    portfolio.savings_goals.append(new_goal)
-    
-    # Update database
+    # Push only the new goal; no need to read the document first
     await db.portfolios.update_one(
         {"user_id": "default"},
-        {"$set": {"savings_goals": [goal.dict() for goal in portfolio.savings_goals]}},
+        {"$push": {"savings_goals": new_goal.model_dump()}},
         upsert=True
     )
-    
+    if _PORTFOLIO_CACHE is not None:
+        _PORTFOLIO_CACHE.savings_goals.append(new_goal)
+
     return {"message": "Savings goal added successfully", "goal": new_goal}
 
 @app.put("/api/savings-goals/{goal_id}")
 async def update_savings_goal(goal_id: str, goal_data: dict, db=Depends(get_database)):
     """Update a savings goal"""
-    portfolio = await get_portfolio(db)
+    portfolio = await get_portfolio(db, projection={"savings_goals": 1})
     
-    for goal in portfolio.savings_goals:
+    # Work on a copy so the (possibly cached) portfolio only picks up the new
+    # values once the DB write has succeeded
+    for i, goal in enumerate(portfolio.savings_goals):
         if goal.id == goal_id:
-            goal.name = goal_data.get("name", goal.name)
-            goal.target_amount = goal_data.get("target_amount", goal.target_amount)
-            goal.current_amount = goal_data.get("current_amount", goal.current_amount)
-            goal.deadline = goal_data.get("deadline", goal.deadline)
+            updated = goal.model_copy()
+            updated.name = goal_data.get("name", updated.name)
+            updated.target_amount = goal_data.get("target_amount", updated.target_amount)
+            updated.current_amount = goal_data.get("current_amount", updated.current_amount)
+            updated.deadline = goal_data.get("deadline", updated.deadline)
+
+            # Write back only the changed sub-document
+            await db.portfolios.update_one(
+                {"user_id": "default"},
+                {"$set": {"savings_goals.$[elem]": updated.model_dump()}},
+                array_filters=[{"elem.id": goal_id}]
+            )
+            portfolio.savings_goals[i] = updated
             break
-    
-    # Update database
-    await db.portfolios.update_one(
-        {"user_id": "default"},
-        {"$set": {"savings_goals": [goal.dict() for goal in portfolio.savings_goals]}},
-        upsert=True
-    )
-    
+
     return {"message": "Savings goal updated successfully"}
 
 @app.delete("/api/savings-goals/{goal_id}")
 async def delete_savings_goal(goal_id: str, db=Depends(get_database)):
     """Delete a savings goal"""
-    portfolio = await get_portfolio(db)
-    
-    portfolio.savings_goals = [g for g in portfolio.savings_goals if g.id != goal_id]
-    
-    # Update database
+    # Pull only the matching goal; no need to read the document first
     await db.portfolios.update_one(
         {"user_id": "default"},
-        {"$set": {"savings_goals": [goal.dict() for goal in portfolio.savings_goals]}},
-        upsert=True
+        {"$pull": {"savings_goals": {"id": goal_id}}}
     )
-    
+    if _PORTFOLIO_CACHE is not None:
+        _PORTFOLIO_CACHE.savings_goals = [
+            g for g in _PORTFOLIO_CACHE.savings_goals if g.id != goal_id
+        ]
+
     return {"message": "Savings goal deleted successfully"}
 
 @app.post("/api/net-worth-snapshot")
@@ -283,59 +393,67 @@ async def create_net_worth_snapshot(db=Depends(get_database)):
     """Create a snapshot of current net worth"""
     portfolio = await get_portfolio(db)
     
-    # Update stock prices first
-    for asset in portfolio.assets:
-        if asset.symbol and asset.type in ["stock", "etf"] and asset.manual_value is None:
-            current_price = get_stock_price(asset.symbol)
-            if current_price > 0 and asset.quantity:
-                asset.value = current_price * asset.quantity
+    # Refresh prices so the snapshot reflects current values
+    await _refresh_prices(db, portfolio)
     
     # Calculate totals
-    total_stocks = sum(a.value for a in portfolio.assets if a.type == "stock")
-    total_etfs = sum(a.value for a in portfolio.assets if a.type == "etf")
-    total_super = sum(a.value for a in portfolio.assets if a.type == "super")
-    total_savings = sum(a.value for a in portfolio.assets if a.type == "savings")
-    net_worth = total_stocks + total_etfs + total_super + total_savings
-    
+    totals, net_worth = _compute_totals(portfolio.assets)
+
     # Create snapshot
     snapshot_id = str(uuid.uuid4())
     snapshot = NetWorthSnapshot(
         id=snapshot_id,
         date=datetime.now(timezone.utc).isoformat(),
-        total_stocks=total_stocks,
-        total_etfs=total_etfs,
-        total_super=total_super,
-        total_savings=total_savings,
+        total_stocks=totals["stock"],
+        total_etfs=totals["etf"],
+        total_super=totals["super"],
+        total_savings=totals["savings"],
         net_worth=net_worth
     )
     
     portfolio.net_worth_history.append(snapshot)
-    
+
     # Keep only last 100 snapshots
     if len(portfolio.net_worth_history) > 100:
         portfolio.net_worth_history = portfolio.net_worth_history[-100:]
-    
-    # Update database
+
+    # Atomic capped push; Mongo trims the history server-side
     await db.portfolios.update_one(
         {"user_id": "default"},
-        {"$set": {
-            "assets": [asset.dict() for asset in portfolio.assets],
-            "net_worth_history": [snap.dict() for snap in portfolio.net_worth_history]
-        }},
+        {"$push": {"net_worth_history": {"$each": [snapshot.model_dump()], "$slice": -100}}},
         upsert=True
     )
-    
+
     return {"message": "Net worth snapshot created", "snapshot": snapshot}
 
+@app.post("/api/refresh-prices")
+async def refresh_prices(db=Depends(get_database)):
+    """Force a live price refresh instead of waiting for the background task"""
+    portfolio = await get_portfolio(db, projection={"assets": 1})
+    refreshed = await _refresh_prices(db, portfolio)
+    return {"message": "Prices refreshed", "assets_updated": refreshed}
+
 @app.get("/api/stock-price/{symbol}")
-async def get_stock_price_endpoint(symbol: str):
+async def get_stock_price_endpoint(symbol: str, response: Response):
     """Get current stock price for a symbol"""
-    price = get_stock_price(symbol.upper())
+    price = await get_stock_price(symbol.upper())
     if price > 0:
+        response.headers["Cache-Control"] = "max-age=60"
         return {"symbol": symbol.upper(), "price": price}
     else:
         raise HTTPException(status_code=404, detail=f"Could not fetch price for {symbol}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # uvloop/httptools swap in the C event loop and HTTP parser. Workers
+    # default to 1 because the in-process portfolio cache has no cross-worker
+    # invalidation; raise WEB_CONCURRENCY only after moving that cache to a
+    # shared store (e.g. Redis).
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1"))
+    )
\ No newline at end of file
@@ -1,12 +1,16 @@
 
 import requests
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class NetWorthAPITester:
     def __init__(self, base_url="https://7f873d82-cd6c-41ff-b7c1-513a2fa6030b.preview.emergentagent.com"):
         self.base_url = base_url
+        self.session = requests.Session()  # Keep-alive connection shared by all tests
+        self.lock = threading.Lock()  # Guards counters when tests run in parallel
         self.tests_run = 0
         self.tests_passed = 0
         self.created_assets = []
@@ -17,22 +21,24 @@ class NetWorthAPITester:
         url = f"{self.base_url}/{endpoint}"
         headers = {'Content-Type': 'application/json'}
         
-        self.tests_run += 1
+        with self.lock:
+            self.tests_run += 1
         print(f"\n🔍 Testing {name}...")
         
         try:
             if method == 'GET':
-                response = requests.get(url, headers=headers)
+                response = self.session.get(url, headers=headers)
             elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers)
+                response = self.session.post(url, json=data, headers=headers)
             elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers)
+                response = self.session.put(url, json=data, headers=headers)
             elif method == 'DELETE':
-                response = requests.delete(url, headers=headers)
+                response = self.session.delete(url, headers=headers)
 
             success = response.status_code == expected_status
             if success:
-                self.tests_passed += 1
+                with self.lock:
+                    self.tests_passed += 1
                 print(f"✅ Passed - Status: {response.status_code}")
                 try:
                     return success, response.json()
@@ -248,6 +254,8 @@ class NetWorthAPITester:
         for goal_id in self.created_goals[:]:
             self.test_delete_savings_goal(goal_id)
 
+        self.session.close()
+
 def main():
     # Setup
     tester = NetWorthAPITester()
@@ -258,10 +266,10 @@ def main():
     # Test 1: Get initial portfolio (should be empty or have existing data)
     tester.test_get_portfolio()
     
-    # Test 2: Test stock price API
+    # Test 2: Test stock price API (independent lookups, run in parallel)
     stock_symbols = ["AAPL", "TSLA", "MSFT", "AMZN"]
-    for symbol in stock_symbols:
-        tester.test_get_stock_price(symbol)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(tester.test_get_stock_price, stock_symbols))
     
     # Test 3: Add assets of different types
     stock_id = tester.test_add_stock("Apple Inc.", "AAPL", 10)